@@ -0,0 +1,251 @@
+"""
+Response caching for LLM subtask calls.
+"""
+
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import logging
+import threading
+import unicodedata
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from anyio import to_thread
+
+from .providers import get_llm_client_for_subtask
+
+logger = logging.getLogger(__name__)
+
+
+def cache_namespace(model_choice: str, system_prompt: str) -> str:
+    """
+    Build the cache namespace for a model + system prompt pair.
+
+    Each system prompt defines a separate subtask, so keying on it keeps
+    responses for different subtasks from colliding.
+    """
+    digest = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+    return f"{model_choice}:{digest}"
+
+
+def exact_cache_key(namespace: str, user_prompt: str) -> str:
+    """
+    Hash a namespaced prompt after normalization so equivalent strings share a key.
+
+    Prompts are NFC-normalized and whitespace runs are collapsed, so prompts
+    that differ only in spacing or line breaks hit the exact tier without
+    needing an embedding lookup.
+    """
+    normalized_prompt = " ".join(unicodedata.normalize("NFC", user_prompt).split())
+    canonical = json.dumps(
+        [unicodedata.normalize("NFC", namespace), normalized_prompt],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ExactCache:
+    """
+    SQLite-backed cache for LLM responses keyed by a hash of the full request.
+
+    Entries persist across restarts, so replaying the same prompts during
+    development or agent retries skips the LLM entirely.
+    """
+
+    def __init__(self, path: str, ttl: float = 86400):
+        self.ttl = ttl
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS llm_responses "
+            "(key TEXT PRIMARY KEY, response TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        # Lets the expiry purge in _set use a range scan instead of reading every row
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS llm_responses_expires_at ON llm_responses (expires_at)"
+        )
+        self._connection.commit()
+
+    def _get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT response FROM llm_responses WHERE key = ? AND expires_at > ?",
+                (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def _set(self, key: str, response: str) -> None:
+        now = time.time()
+        with self._lock:
+            # Drop expired rows here so the database stays bounded by the TTL
+            self._connection.execute("DELETE FROM llm_responses WHERE expires_at <= ?", (now,))
+            self._connection.execute(
+                "INSERT OR REPLACE INTO llm_responses (key, response, expires_at) VALUES (?, ?, ?)",
+                (key, response, now + self.ttl)
+            )
+            self._connection.commit()
+
+    async def get(self, key: str) -> Optional[str]:
+        try:
+            return await to_thread.run_sync(self._get, key)
+        except sqlite3.Error as e:
+            logger.warning(f"Exact cache lookup failed: {e}")
+            return None
+
+    async def set(self, key: str, response: str) -> None:
+        try:
+            await to_thread.run_sync(self._set, key, response)
+        except sqlite3.Error as e:
+            logger.warning(f"Exact cache store failed: {e}")
+
+
+class _Namespace:
+    """Normalized embeddings and cached responses for one namespace."""
+
+    def __init__(self, dim: int):
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+        self.responses: List[str] = []
+        self.expires_at: List[float] = []
+
+    def prune(self, now: float) -> None:
+        keep = [i for i, expiry in enumerate(self.expires_at) if expiry > now]
+        if len(keep) == len(self.expires_at):
+            return
+        self.vectors = self.vectors[keep]
+        self.responses = [self.responses[i] for i in keep]
+        self.expires_at = [self.expires_at[i] for i in keep]
+
+
+class SemanticCache:
+    """
+    In-memory cache that matches prompts by embedding cosine similarity.
+
+    A lookup is a single matrix-vector product over the namespace's stored
+    embeddings, so a hit replaces a full LLM round-trip with one embedding call.
+    """
+
+    def __init__(
+        self,
+        embedding_model: str,
+        threshold: float = 0.97,
+        ttl: float = 86400,
+        max_entries: int = 1024
+    ):
+        self.embedding_model = embedding_model
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._namespaces: Dict[str, _Namespace] = {}
+
+    async def _embed(self, text: str) -> np.ndarray:
+        llm_client = get_llm_client_for_subtask()
+        response = await llm_client.embeddings.create(model=self.embedding_model, input=text)
+        vector = np.asarray(response.data[0].embedding, dtype=np.float32)
+        vector /= np.linalg.norm(vector)
+        return vector
+
+    async def get(self, namespace: str, prompt: str) -> Tuple[Optional[str], Optional[np.ndarray]]:
+        """
+        Look up a prompt in the namespace.
+
+        Returns:
+            The cached response (or None) and the prompt's embedding, if one was
+            computed. Pass the embedding to set() on a miss to avoid embedding twice.
+        """
+        entries = self._namespaces.get(namespace)
+        if entries is None:
+            return None, None
+        entries.prune(time.monotonic())
+        if not entries.responses:
+            return None, None
+        try:
+            vector = await self._embed(prompt)
+        except Exception as e:
+            logger.warning(f"Semantic cache lookup failed: {e}")
+            return None, None
+        # Other callers may have pruned the namespace while the embedding was in flight
+        entries.prune(time.monotonic())
+        if not entries.responses:
+            return None, vector
+        similarities = entries.vectors @ vector
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            return None, vector
+        return entries.responses[best], vector
+
+    async def set(
+        self,
+        namespace: str,
+        prompt: str,
+        response: str,
+        vector: Optional[np.ndarray] = None
+    ) -> None:
+        if vector is None:
+            try:
+                vector = await self._embed(prompt)
+            except Exception as e:
+                logger.warning(f"Semantic cache store failed: {e}")
+                return
+        entries = self._namespaces.setdefault(namespace, _Namespace(vector.shape[0]))
+        entries.prune(time.monotonic())
+        if len(entries.responses) >= self.max_entries:
+            entries.vectors = entries.vectors[1:]
+            entries.responses.pop(0)
+            entries.expires_at.pop(0)
+        entries.vectors = np.vstack([entries.vectors, vector])
+        entries.responses.append(response)
+        entries.expires_at.append(time.monotonic() + self.ttl)
+
+
+@lru_cache(maxsize=1)
+def get_semantic_cache() -> Optional[SemanticCache]:
+    """
+    Get the process-wide semantic cache based on environment variables.
+
+    Returns:
+        Configured SemanticCache, or None when LLM_CACHE_EMBEDDING_MODEL is unset
+    """
+    embedding_model = os.getenv('LLM_CACHE_EMBEDDING_MODEL')
+    if not embedding_model:
+        return None
+    return SemanticCache(
+        embedding_model=embedding_model,
+        threshold=float(os.getenv('LLM_CACHE_SIMILARITY_THRESHOLD', '0.97')),
+        ttl=float(os.getenv('LLM_CACHE_TTL', '86400'))
+    )
+
+
+_exact_cache: Optional[ExactCache] = None
+_exact_cache_lock = asyncio.Lock()
+
+async def get_exact_cache() -> Optional[ExactCache]:
+    """
+    Get the process-wide exact-match cache based on environment variables.
+
+    The SQLite file is opened on a worker thread the first time, so the event
+    loop never blocks on directory creation or schema setup.
+
+    Returns:
+        Configured ExactCache, or None unless ENABLE_LLM_CACHE is "true"
+    """
+    global _exact_cache
+    if os.getenv('ENABLE_LLM_CACHE') != "true":
+        return None
+    if _exact_cache is None:
+        async with _exact_cache_lock:
+            if _exact_cache is None:
+                default_path = os.path.join(os.path.expanduser("~"), ".cache", "basic-mcp", "llm_responses.db")
+                _exact_cache = await to_thread.run_sync(
+                    ExactCache,
+                    os.getenv('LLM_CACHE_PATH', default_path),
+                    float(os.getenv('LLM_CACHE_TTL', '86400'))
+                )
+    return _exact_cache
@@ -7,6 +7,7 @@ from .models import (
 from .tools import (
     refine_text_with_llm
 )
+from .providers import close_llm_clients
 from .prompts import (
     OVERVIEW_REFINEMENT_SYSTEM_PROMPT,
     OVERVIEW_REFINEMENT_USER_PROMPT
@@ -46,5 +47,12 @@ async def main():
 
     print(refined_overview)
 
+    await close_llm_clients()
+
 if __name__ == "__main__":
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
     asyncio.run(main())
\ No newline at end of file
@@ -2,8 +2,7 @@
 Pydantic models for data validation and serialization.
 """
 
-from typing import List, Dict, Any, Optional, Literal, Callable, Awaitable
-from pydantic import BaseModel, Field, ConfigDict, field_validator, constr
+from pydantic import BaseModel, Field, constr
 import os
 
 # Tool Input Models
@@ -13,6 +13,8 @@ Always:
 """
 
 OVERVIEW_REFINEMENT_USER_PROMPT = """
+Please refine the project overview according to the user's clarification below.
+
 Original project overview:
 {overview}
 
@@ -21,6 +23,4 @@ The agent asked:
 
 The user clarified:
 {user_clarification}
-
-Please refine the project overview accordingly.
 """
\ No newline at end of file
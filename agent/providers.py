@@ -3,19 +3,79 @@ Flexible provider configuration for LLM.
 """
 
 import os
-from openai import AsyncOpenAI
+import hashlib
+from typing import Any, Dict, Optional, Tuple
+
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+# One client per (base_url, api_key) so its connection pool is reused across calls
+_llm_clients: Dict[Tuple[Optional[str], Optional[str]], AsyncOpenAI] = {}
 
 def get_llm_client_for_subtask() -> AsyncOpenAI:
     """
-    Get embedding client configuration based on environment variables.
-    
+    Get the shared LLM client configured from environment variables.
+
+    The client is created on first use and reused, keeping TCP/TLS connections
+    alive between calls.
+
     Returns:
-        Configured OpenAI-compatible client for embeddings
+        Configured OpenAI-compatible client for LLM subtasks
     """
     base_url = os.getenv('LLM_BASE_URL')
     api_key = os.getenv('LLM_API_KEY')
-    
-    return AsyncOpenAI(
-        base_url=base_url,
-        api_key=api_key
-    )
+
+    llm_client = _llm_clients.get((base_url, api_key))
+    if llm_client is None:
+        llm_client = AsyncOpenAI(
+            base_url=base_url,
+            api_key=api_key,
+            http_client=DefaultAsyncHttpxClient(http2=True)
+        )
+        _llm_clients[(base_url, api_key)] = llm_client
+    return llm_client
+
+
+async def close_llm_clients() -> None:
+    """Close the shared LLM clients and their connection pools."""
+    llm_clients = list(_llm_clients.values())
+    _llm_clients.clear()
+    for llm_client in llm_clients:
+        await llm_client.close()
+
+
+def build_system_message(system_prompt: str) -> Dict[str, Any]:
+    """
+    Build the system message for a subtask call.
+
+    When LLM_ANTHROPIC_CACHE_CONTROL is "true", the system prompt is sent as a text
+    block with an ephemeral cache_control marker (Anthropic-style, accepted by
+    OpenAI-compatible gateways such as OpenRouter and LiteLLM). Only the static
+    system prompt is marked; user content stays outside the cached prefix.
+
+    Returns:
+        Chat completion message dict for the system role
+    """
+    if os.getenv('LLM_ANTHROPIC_CACHE_CONTROL') == "true":
+        return {
+            "role": "system",
+            "content": [
+                {"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}
+            ],
+        }
+    return {"role": "system", "content": system_prompt}
+
+
+def build_provider_extra_body(system_prompt: str) -> Optional[Dict[str, Any]]:
+    """
+    Build provider-specific request fields for a subtask call.
+
+    When LLM_OPENAI_PROMPT_CACHE_KEY is "true", an OpenAI prompt_cache_key
+    derived from the system prompt routes calls sharing it to the same
+    provider-side prefix cache.
+
+    Returns:
+        Fields to send as extra_body, or None when no option is enabled
+    """
+    if os.getenv('LLM_OPENAI_PROMPT_CACHE_KEY') == "true":
+        return {"prompt_cache_key": hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:32]}
+    return None
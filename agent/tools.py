@@ -2,44 +2,268 @@
 Tools.
 """
 
-import traceback
+import io
+import os
+import json
+import time
+import asyncio
 import logging
-from typing import AsyncGenerator, List, Dict, Any, Optional, Callable, Awaitable
+from contextlib import aclosing, asynccontextmanager
+from typing import AsyncGenerator, AsyncIterator, List, Dict, Any, Optional, Callable, Awaitable
 
-from .providers import get_llm_client_for_subtask
+from openai import NOT_GIVEN
+
+from .providers import build_provider_extra_body, build_system_message, get_llm_client_for_subtask
+from .cache import cache_namespace, exact_cache_key, get_exact_cache, get_semantic_cache
 
 logger = logging.getLogger(__name__)
 
-async def stream_llm_response(model_choice: str, system_prompt: str, user_prompt: str) -> AsyncGenerator[str, None]:
+# Streamed chunks are forwarded once this many characters are pending or this many seconds have passed
+STREAM_FLUSH_CHARS = 32
+STREAM_FLUSH_INTERVAL = 0.016
+
+def build_chat_request(model_choice: str, system_prompt: str, user_prompt: str) -> Dict[str, Any]:
+    return {
+        "model": model_choice,
+        "messages": [
+            build_system_message(system_prompt),
+            {"role": "user", "content": user_prompt},
+        ],
+        "extra_body": build_provider_extra_body(system_prompt),
+    }
+
+
+@asynccontextmanager
+async def llm_call_span(model_choice: str, call_type: str) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Time an LLM call and emit one log line with its token usage.
+
+    The caller stores the response's usage object under span["usage"].
+    Failures are logged once, with traceback, and re-raised.
+    """
+    span: Dict[str, Any] = {"usage": None}
+    start = time.perf_counter()
     try:
+        yield span
+    except (GeneratorExit, asyncio.CancelledError):
+        logger.warning(f"LLM {call_type} for model {model_choice} was closed before completing")
+        raise
+    except Exception as e:
+        logger.exception(f"LLM {call_type} failed for model {model_choice}: {e}")
+        raise
+    usage = span["usage"]
+    logger.info(
+        "LLM %s model=%s duration_ms=%.1f prompt_tokens=%s completion_tokens=%s",
+        call_type,
+        model_choice,
+        (time.perf_counter() - start) * 1000,
+        usage.prompt_tokens if usage else None,
+        usage.completion_tokens if usage else None,
+    )
+
+
+async def stream_llm_response(model_choice: str, system_prompt: str, user_prompt: str) -> AsyncGenerator[str, None]:
+    async with llm_call_span(model_choice, "stream") as span:
         llm_client = get_llm_client_for_subtask()
+        stream_options = NOT_GIVEN
+        if os.getenv('LLM_STREAM_USAGE') == "true":
+            # Not every OpenAI-compatible server accepts stream_options, so only ask when enabled
+            stream_options = {"include_usage": True}
         stream = await llm_client.chat.completions.create(
-            model=model_choice,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
+            **build_chat_request(model_choice, system_prompt, user_prompt),
             stream=True,
+            stream_options=stream_options,
         )
         async for chunk in stream:
+            # With include_usage, the final chunk carries usage and no choices
+            if chunk.usage is not None:
+                span["usage"] = chunk.usage
+            if not chunk.choices:
+                continue
             delta = chunk.choices[0].delta.content or ""
             if delta:
                 yield delta
-    except Exception as e:
-        logger.error(f"Failed to stream LLM response: {e}")
-        traceback.print_exc()
-        raise
+
+
+async def complete_text_with_llm(model_choice: str, system_prompt: str, user_prompt: str) -> str:
+    """Non-streaming completion for callers that only need the final text."""
+    async with llm_call_span(model_choice, "completion") as span:
+        llm_client = get_llm_client_for_subtask()
+        response = await llm_client.chat.completions.create(
+            **build_chat_request(model_choice, system_prompt, user_prompt)
+        )
+        span["usage"] = response.usage
+        return response.choices[0].message.content or ""
+
+
+async def stream_text_to_client(
+        model_choice: str,
+        system_prompt: str,
+        user_prompt: str,
+        send_func: Callable[[Dict[str, Any]], Awaitable[None]]
+    ) -> str:
+    """
+    Stream an LLM response to the client, coalescing small chunks into fewer sends.
+
+    Returns:
+        The full response text
+    """
+    loop = asyncio.get_running_loop()
+    llm_response = io.StringIO()
+    pending: List[str] = []
+    pending_chars = 0
+    last_flush = loop.time()
+    # aclosing() shuts the LLM stream as soon as we stop iterating, e.g. when send_func raises
+    async with aclosing(stream_llm_response(model_choice, system_prompt, user_prompt)) as stream:
+        async for chunk in stream:
+            llm_response.write(chunk)
+            pending.append(chunk)
+            pending_chars += len(chunk)
+            if pending_chars >= STREAM_FLUSH_CHARS or loop.time() - last_flush >= STREAM_FLUSH_INTERVAL:
+                await send_func({"type": "subtask-llm-text", "content": "".join(pending)})
+                pending.clear()
+                pending_chars = 0
+                last_flush = loop.time()
+    if pending:
+        await send_func({"type": "subtask-llm-text", "content": "".join(pending)})
+    return llm_response.getvalue()
 
 
 async def refine_text_with_llm(
         model_choice: str, 
         system_prompt: str, 
         user_prompt: str, 
-        # send_func: Callable[[Dict[str, Any]], Awaitable[None]] # uncomment when need to stream tokens to client
+        send_func: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
     ) -> str:
-    llm_response = []
-    async for chunk in stream_llm_response(model_choice, system_prompt, user_prompt):
-        # await send_func({"type": "subtask-llm-text", "content": chunk})
-        llm_response.append(chunk)
-    return "".join(llm_response)
+    namespace = cache_namespace(model_choice, system_prompt)
+    cached_response = None
+    exact_cache = await get_exact_cache()
+    if exact_cache is not None:
+        key = exact_cache_key(namespace, user_prompt)
+        cached_response = await exact_cache.get(key)
+        if cached_response is not None:
+            logger.debug("Exact cache hit for LLM subtask")
+
+    cache = get_semantic_cache()
+    prompt_vector = None
+    if cached_response is None and cache is not None:
+        cached_response, prompt_vector = await cache.get(namespace, user_prompt)
+        if cached_response is not None:
+            logger.debug("Semantic cache hit for LLM subtask")
+
+    if cached_response is not None:
+        if send_func is not None:
+            await send_func({"type": "subtask-llm-text", "content": cached_response})
+        return cached_response
+
+    if send_func is not None:
+        refined_text = await stream_text_to_client(model_choice, system_prompt, user_prompt, send_func)
+    else:
+        # Nothing to stream, so skip per-chunk handling entirely
+        refined_text = await complete_text_with_llm(model_choice, system_prompt, user_prompt)
+
+    if exact_cache is not None:
+        await exact_cache.set(key, refined_text)
+    if cache is not None:
+        await cache.set(namespace, user_prompt, refined_text, prompt_vector)
+    return refined_text
+
+
+async def refine_texts_with_llm(
+        model_choice: str,
+        system_prompt: str,
+        user_prompts: List[str],
+        max_concurrency: Optional[int] = None
+    ) -> List[str]:
+    """
+    Run independent refinements concurrently, bounded by a semaphore.
+
+    With USE_OPENAI_BATCH=true (or 1) the prompts are submitted as a single OpenAI Batch
+    API job instead, for offline flows that can wait for the discounted batch.
+    Results are returned in the same order as `user_prompts`.
+    """
+    if os.getenv('USE_OPENAI_BATCH') in ("true", "1"):
+        return await refine_texts_with_batch_api(model_choice, system_prompt, user_prompts)
+
+    if max_concurrency is None:
+        max_concurrency = int(os.getenv('LLM_MAX_CONCURRENCY', '5'))
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def refine_one(user_prompt: str) -> str:
+        async with semaphore:
+            return await refine_text_with_llm(model_choice, system_prompt, user_prompt)
+
+    return list(await asyncio.gather(*(refine_one(user_prompt) for user_prompt in user_prompts)))
+
+
+async def refine_texts_with_batch_api(
+        model_choice: str,
+        system_prompt: str,
+        user_prompts: List[str],
+        poll_interval: Optional[float] = None
+    ) -> List[str]:
+    """
+    Submit refinements as one OpenAI Batch API job and wait for the results.
+
+    Results are returned in the same order as `user_prompts`.
+    """
+    if poll_interval is None:
+        poll_interval = float(os.getenv('LLM_BATCH_POLL_INTERVAL', '30'))
+
+    namespace = cache_namespace(model_choice, system_prompt)
+    refined_texts: List[Optional[str]] = [None] * len(user_prompts)
+    exact_cache = await get_exact_cache()
+    if exact_cache is not None:
+        keys = [exact_cache_key(namespace, user_prompt) for user_prompt in user_prompts]
+        for index, key in enumerate(keys):
+            refined_texts[index] = await exact_cache.get(key)
+    pending = [index for index, text in enumerate(refined_texts) if text is None]
+    if not pending:
+        return refined_texts
+
+    requests = []
+    for index in pending:
+        body = build_chat_request(model_choice, system_prompt, user_prompts[index])
+        body.update(body.pop("extra_body") or {})
+        requests.append(json.dumps({
+            "custom_id": str(index),
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": body,
+        }, ensure_ascii=False))
+
+    llm_client = get_llm_client_for_subtask()
+    batch_input = await llm_client.files.create(
+        file=("refinements.jsonl", "\n".join(requests).encode("utf-8")),
+        purpose="batch"
+    )
+    batch = await llm_client.batches.create(
+        input_file_id=batch_input.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h"
+    )
+    logger.info(f"Submitted LLM batch {batch.id} with {len(requests)} requests")
+
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        await asyncio.sleep(poll_interval)
+        batch = await llm_client.batches.retrieve(batch.id)
+    if batch.status != "completed" or batch.output_file_id is None:
+        raise RuntimeError(f"LLM batch {batch.id} ended with status {batch.status}")
+
+    batch_output = await llm_client.files.content(batch.output_file_id)
+    for line in batch_output.text.splitlines():
+        record = json.loads(line)
+        if record.get("error") is None:
+            refined_texts[int(record["custom_id"])] = record["response"]["body"]["choices"][0]["message"]["content"]
+
+    failed = [index for index in pending if refined_texts[index] is None]
+    if failed:
+        raise RuntimeError(f"LLM batch {batch.id} has no result for requests {failed}")
 
+    cache = get_semantic_cache()
+    for index in pending:
+        if exact_cache is not None:
+            await exact_cache.set(keys[index], refined_texts[index])
+        if cache is not None:
+            await cache.set(namespace, user_prompts[index], refined_texts[index])
+    return refined_texts
@@ -1,19 +1,29 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastmcp import FastMCP
-from typing import Dict, Any
+from typing import Dict
 import os
+from anyio import to_thread
 import uvicorn
 import logging
 
+from agent.providers import close_llm_clients
+
 logger = logging.getLogger(__name__)
 
 # Application configuration
-LOG_LEVEL = os.getenv("LOG_LEVEL")
+LOG_LEVEL = (os.getenv("LOG_LEVEL") or "INFO").upper()
 DEBUG = os.getenv("DEBUG")
 
+# Skip per-record thread/process info and caller lookup; the format below uses none of them
+logging.logThreads = False
+logging.logProcesses = False
+logging.logMultiprocessing = False
+logging._srcfile = None
+
 # Configure logging
 logging.basicConfig(
-    level=getattr(logging, LOG_LEVEL.upper()),
+    level=getattr(logging, LOG_LEVEL),
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 )
 
@@ -21,13 +31,28 @@ logging.basicConfig(
 if DEBUG == "true":
     logger.setLevel(logging.DEBUG)
 
-app = FastAPI(title="Text Assistant MCP Server", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Sync handlers run on anyio worker threads; lift the default cap of 40
+    to_thread.current_default_thread_limiter().total_tokens = int(os.getenv("THREADPOOL_SIZE", "200"))
+    yield
+    await close_llm_clients()
+
+app = FastAPI(title="Text Assistant MCP Server", version="1.0.0", lifespan=lifespan)
 
 # Initialize FastMCP
 mcp = FastMCP("text-assistant-mcp")
 
 # Get the directory where this script is located
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+EXAMPLE_TEXT_PATH = os.path.join(BASE_DIR, "resources", "example-text.txt")
+SUMMARIZE_PROMPT_PATH = os.path.join(BASE_DIR, "prompts", "summarize_prompt.txt")
+
+# The resource and prompt files never change at runtime, so read them once at import
+with open(EXAMPLE_TEXT_PATH, "r") as f:
+    _EXAMPLE_TEXT = f.read().strip()
+with open(SUMMARIZE_PROMPT_PATH, "r") as f:
+    _SUMMARIZE_TEMPLATE = f.read().strip()
 
 # Define tools
 @mcp.tool("count_words")
@@ -44,18 +69,13 @@ def to_uppercase(text: str) -> str:
 @mcp.resource("mcp://text-assistant/resources/example-text")
 def get_example_text() -> str:
     """A sample paragraph of text that agents can read."""
-    resource_path = os.path.join(BASE_DIR, "resources", "example-text.txt")
-    with open(resource_path, "r") as f:
-        return f.read().strip()
+    return _EXAMPLE_TEXT
 
 # Define prompts
 @mcp.prompt("summarize_prompt")
 def summarize_prompt(language: str, text: str) -> str:
     """Allows the agent to generate a summary in the desired language by filling in `language` and `text`."""
-    prompt_path = os.path.join(BASE_DIR, "prompts", "summarize_prompt.txt")
-    with open(prompt_path, "r") as f:
-        template = f.read().strip()
-    return template.format(language=language, text=text)
+    return _SUMMARIZE_TEMPLATE.format(language=language, text=text)
 
 @app.get("/health")
 def health_check() -> Dict[str, str]:
@@ -63,3 +83,5 @@ def health_check() -> Dict[str, str]:
     logger.debug(f"DEBUG LOGGING")
     return {"status": "healthy", "service": "Text Assistant MCP Server"}
 
+if __name__ == "__main__":
+    uvicorn.run(app, host="0.0.0.0", port=5000, loop="uvloop", http="httptools")
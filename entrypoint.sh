@@ -22,10 +22,10 @@ elif [ "$MODE" = "llm_call" ]; then
 elif [ "$MODE" = "api" ]; then
     if [ "$DEBUG" = "true" ]; then
         echo "🛠️  Running fastapi in DEBUG mode..."
-        exec python -m debugpy --listen 0.0.0.0:5678 --wait-for-client -m uvicorn app:app --host=0.0.0.0 --port=5000 --reload
+        exec python -m debugpy --listen 0.0.0.0:5678 --wait-for-client -m uvicorn app:app --host=0.0.0.0 --port=5000 --loop=uvloop --http=httptools --reload
     else
         echo "🚀 Running fastapi in normal mode..."
-        exec python -m uvicorn app:app --host=0.0.0.0 --port=5000
+        exec python -m uvicorn app:app --host=0.0.0.0 --port=5000 --loop=uvloop --http=httptools
     fi
 
 else